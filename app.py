@@ -1,6 +1,6 @@
 import streamlit as st
 import os
-from ingestion import DocumentIngestor, VectorEngine
+from ingestion import DocumentIngestor, get_vector_engine
 from logic import gather_context, generate_hybrid_answer
 
 if "web_search_enabled" not in st.session_state:
@@ -9,18 +9,32 @@ if "web_search_enabled" not in st.session_state:
 # --- Page Configuration ---
 st.set_page_config(page_title="Hybrid RAG Search", page_icon="🔍", layout="wide")
 
+@st.cache_resource
+def _warmup(_engine):
+    """Runs one dummy embed + search at startup.
+
+    The first real query would otherwise pay model init, index load, and
+    FAISS's first-search setup serially; cache_resource makes this a
+    once-per-process cost. Failures (e.g. no index yet) are harmless.
+    """
+    try:
+        _engine.embeddings.embed_query("warmup")
+        _engine.semantic_search("warmup", k=1)
+    except Exception:
+        pass
+    return True
+
 # Initialize session state for message history and document indexing
 if "messages" not in st.session_state:
     st.session_state.messages = []
 if "ingestor" not in st.session_state:
     st.session_state.ingestor = DocumentIngestor()
 if "vector_engine" not in st.session_state:
-    engine = VectorEngine()
-    try:
-        engine.load_faiss_index() # Attempt to load existing index
-        st.session_state.vector_engine = engine
-    except Exception:
-        st.session_state.vector_engine = engine
+    # Cached process-wide engine (shared with logic.py) -- the embedding
+    # model and FAISS index load once per process, not once per session
+    st.session_state.vector_engine = get_vector_engine()
+    _warmup(st.session_state.vector_engine)
+    if st.session_state.vector_engine.vector_store is None:
         st.sidebar.warning("No existing index found. Please upload documents.")
 
 # --- Sidebar: Document Management ---
@@ -88,10 +102,6 @@ if prompt := st.chat_input("Ask me something..."):
             # Pass the boolean directly into your logic
             context = gather_context(prompt, web_enabled=is_web_on)
             status.update(label="Generating grounded answer...", state="running")
-            
-            # Generate final response
-            answer = generate_hybrid_answer(prompt, context)
-            status.update(label="Analysis complete!", state="complete")
 
             # Visual Indicators based on Route
             route_icons = {"internal": "📄 Document-based", "web": "🌐 Web-based", "hybrid": "🔀 Hybrid"}
@@ -101,8 +111,12 @@ if prompt := st.chat_input("Ask me something..."):
             tab_ans, tab_doc, tab_web = st.tabs(["💡 Answer", "📄 Doc Evidence", "🌐 Web Evidence"])
             
             with tab_ans:
-                st.markdown(answer)
-            
+                # Stream tokens as they land; write_stream returns the full
+                # text once generation finishes
+                answer = st.write_stream(generate_hybrid_answer(prompt, context))
+            status.update(label="Analysis complete!", state="complete")
+
+
             with tab_doc:
                 if context.get("docs"):
                     for d in context["docs"]:
